@@ -7,6 +7,7 @@ from glob import glob
 import torch, face_detection
 from models import Wav2Lip
 import platform
+from contextlib import nullcontext
 
 # Ensure temp directory exists
 os.makedirs('temp', exist_ok=True)
@@ -53,11 +54,19 @@ parser.add_argument('--rotate', default=False, action='store_true',
 parser.add_argument('--nosmooth', default=False, action='store_true',
 					help='Prevent smoothing face detections over a short temporal window')
 
-args = parser.parse_args()
-args.img_size = 96
+parser.add_argument('--fp16', default=False, action='store_true',
+					help='Run the model in half precision on CUDA (bf16 where supported). Ignored on CPU')
 
-if os.path.isfile(args.face) and args.face.split('.')[1] in ['jpg', 'png', 'jpeg']:
-	args.static = True
+parser.add_argument('--vcodec', type=str, default=None,
+					help='ffmpeg video encoder for the final mux, e.g. h264_nvenc. Default: ffmpeg\'s choice')
+
+def parse_args(argv=None):
+	args = parser.parse_args(argv)
+	args.img_size = 96
+
+	if os.path.isfile(args.face) and args.face.split('.')[1] in ['jpg', 'png', 'jpeg']:
+		args.static = True
+	return args
 
 def get_smoothened_boxes(boxes, T):
 	for i in range(len(boxes)):
@@ -181,6 +190,21 @@ def load_model(path):
 	model = model.to(device)
 	return model.eval()
 
+def precision(fp16):
+	# Half precision only applies on CUDA; bf16 where the GPU supports it
+	if fp16 and device == 'cuda':
+		half_dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+		return torch.autocast('cuda', dtype=half_dtype)
+	return nullcontext()
+
+_models = {}
+
+def get_model(path):
+	# Loaded once per process, so a long-lived worker reuses the weights across jobs
+	if path not in _models:
+		_models[path] = load_model(path)
+	return _models[path]
+
 def main():
 	if not os.path.isfile(args.face):
 		raise ValueError('--face argument must be a valid path to video/image file')
@@ -252,7 +276,7 @@ def main():
 	for i, (img_batch, mel_batch, frames, coords) in enumerate(tqdm(gen, 
 											total=int(np.ceil(float(len(mel_chunks))/batch_size)))):
 		if i == 0:
-			model = load_model(args.checkpoint_path)
+			model = get_model(args.checkpoint_path)
 			print ("Model loaded")
 
 			frame_h, frame_w = full_frames[0].shape[:-1]
@@ -262,10 +286,10 @@ def main():
 		img_batch = torch.FloatTensor(np.transpose(img_batch, (0, 3, 1, 2))).to(device)
 		mel_batch = torch.FloatTensor(np.transpose(mel_batch, (0, 3, 1, 2))).to(device)
 
-		with torch.no_grad():
+		with torch.no_grad(), precision(args.fp16):
 			pred = model(mel_batch, img_batch)
 
-		pred = pred.cpu().numpy().transpose(0, 2, 3, 1) * 255.
+		pred = pred.float().cpu().numpy().transpose(0, 2, 3, 1) * 255.
 		
 		for p, f, c in zip(pred, frames, coords):
 			y1, y2, x1, x2 = c
@@ -276,8 +300,10 @@ def main():
 
 	out.release()
 
-	command = 'ffmpeg -y -i {} -i {} -strict -2 -q:v 1 {}'.format(args.audio, 'temp/result.avi', args.outfile)
+	vcodec = '-c:v {} '.format(args.vcodec) if args.vcodec else ''
+	command = 'ffmpeg -y -i {} -i {} -strict -2 {}-q:v 1 {}'.format(args.audio, 'temp/result.avi', vcodec, args.outfile)
 	subprocess.call(command, shell=platform.system() != 'Windows')
 
 if __name__ == '__main__':
+	args = parse_args()
 	main()
@@ -0,0 +1,95 @@
+"""
+Long-lived Wav2Lip worker: the model is loaded once and reused for every job.
+
+Reads one JSON job per line on stdin with the inference.py arguments
+({"checkpoint_path", "face", "audio", "outfile", "pads", "fp16", "vcodec"}) and answers each
+with one JSON line on stdout: {"ok": true, "outfile": ...} or
+{"ok": false, "error": ...}. All logging goes to stderr.
+
+An optional checkpoint path on the command line is loaded at startup, so the
+model is warm before the first job arrives. On CUDA with torch >= 2.0 it is
+also compiled with torch.compile and run once on a dummy batch whose batch
+dimension is marked dynamic, so jobs of any length (including the short final
+batch) reuse that graph. Inductor's on-disk cache lives next to the
+checkpoint, so later worker starts reuse the compiled kernels.
+
+Once startup is done the worker writes {"ready": true} before reading jobs,
+so callers can time jobs separately from model load and compilation.
+"""
+import json, os, sys, traceback
+
+if __name__ == '__main__':
+	# Keep the real stdout for responses only; inference prints and the
+	# ffmpeg child processes it spawns write to stderr instead. This must
+	# happen before importing inference, which prints at import time
+	responses = os.fdopen(os.dup(1), 'w')
+	os.dup2(2, 1)
+	sys.stdout = sys.stderr
+
+import torch
+import inference
+
+def job_argv(job):
+	argv = ['--checkpoint_path', job['checkpoint_path'],
+			'--face', job['face'],
+			'--audio', job['audio'],
+			'--outfile', job['outfile']]
+	if job.get('pads'):
+		argv += ['--pads'] + [str(p) for p in job['pads']]
+	if job.get('fp16'):
+		argv.append('--fp16')
+	if job.get('vcodec'):
+		argv += ['--vcodec', job['vcodec']]
+	return argv
+
+def preload_model(checkpoint_path):
+	model = inference.get_model(checkpoint_path)
+	if inference.device == 'cuda' and hasattr(torch, 'compile'):
+		compile_model(checkpoint_path, model)
+
+def compile_model(checkpoint_path, model, batch_size=128, fp16=True):
+	cache_dir = os.path.join(os.path.dirname(os.path.abspath(checkpoint_path)), 'inductor_cache')
+	os.environ.setdefault('TORCHINDUCTOR_CACHE_DIR', cache_dir)
+	os.environ.setdefault('TORCHINDUCTOR_FX_GRAPH_CACHE', '1')
+	try:
+		compiled = torch.compile(model)
+		# Same shapes and precision as a default job: (B, 1, 80, 16) mels, (B, 6, 96, 96) faces
+		mel = torch.zeros(batch_size, 1, 80, 16, device='cuda')
+		face = torch.zeros(batch_size, 6, 96, 96, device='cuda')
+		# Every job ends with a partial batch; keep B symbolic so it doesn't recompile
+		torch._dynamo.mark_dynamic(mel, 0)
+		torch._dynamo.mark_dynamic(face, 0)
+		with torch.no_grad(), inference.precision(fp16):
+			compiled(mel, face)
+	except Exception:
+		# No compiler backend (e.g. triton missing) - keep the eager model
+		traceback.print_exc()
+		return
+	inference._models[checkpoint_path] = compiled
+
+def serve(responses):
+	for line in sys.stdin:
+		line = line.strip()
+		if not line:
+			continue
+		try:
+			job = json.loads(line)
+			inference.args = inference.parse_args(job_argv(job))
+			inference.main()
+			response = {'ok': True, 'outfile': job['outfile']}
+		except (Exception, SystemExit) as e: # argparse exits on bad arguments
+			traceback.print_exc()
+			response = {'ok': False, 'error': '{}: {}'.format(type(e).__name__, e)}
+		responses.write(json.dumps(response) + '\n')
+		responses.flush()
+
+if __name__ == '__main__':
+	if len(sys.argv) > 1:
+		try:
+			preload_model(sys.argv[1])
+		except Exception:
+			# Jobs will report the same load error with their own response
+			traceback.print_exc()
+	responses.write(json.dumps({'ready': True}) + '\n')
+	responses.flush()
+	serve(responses)
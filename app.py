@@ -17,7 +17,7 @@ from ui import setup_ui, display_category_section, display_article_card, display
 from english_news import process_english_news
 from urdu_news import process_urdu_news
 from config import Config
-from video import generate_video, validate_video_requirements, ensure_wav2lip_model
+from video import generate_video, validate_video_requirements, ensure_wav2lip_model, warm_up_wav2lip
 from tts import generate_audio
 from cache_manager import get_cache_status
 from async_processor import async_processor 
@@ -223,6 +223,9 @@ def main():
                             st.error("Please check video requirements in the sidebar")
                             st.stop()
 
+                        # Load the Wav2Lip model while the audio is generated
+                        warm_up_wav2lip()
+
                         # Check text content
                         tts_text = selected_article.get('tts_text', '')
                         print(f"📝 Article text length: {len(tts_text)} chars")
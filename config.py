@@ -32,6 +32,10 @@ class Config:
     ARTICLE_AGE_LIMIT = 48
     MAX_FEED_ENTRIES = 5
     VIDEO_TIMEOUT = 60
+    # Videos prepared in parallel by generate_videos; Wav2Lip itself runs one at a time
+    MAX_CONCURRENT_JOBS = 3
+    # Optional SHA256 pin for the downloaded Wav2Lip checkpoint
+    WAV2LIP_CHECKPOINT_SHA256 = os.environ.get('WAV2LIP_CHECKPOINT_SHA256')
     MAX_RETRY_ATTEMPTS = 3
     REQUEST_TIMEOUT = 20
 
@@ -1,6 +1,8 @@
 import re
+import math
+import time
+import functools
 import streamlit as st
-import textwrap
 import logging
 import validators
 import html
@@ -12,6 +14,103 @@ from config import Config
 
 logger = logging.getLogger(__name__)
 
+# lxml's C cleaner replaces the BeautifulSoup traversal when available
+try:
+    from lxml import html as lxml_html
+    from lxml.html.clean import Cleaner
+    # Only script/style/comments are dropped with their content; every other
+    # Cleaner default (forms, frames, embedded, ...) would also discard text
+    _HTML_CLEANER = Cleaner(
+        scripts=True, javascript=True, style=True, comments=True,
+        processing_instructions=True, page_structure=False,
+        forms=False, embedded=False, frames=False, meta=False, links=False,
+        annoying_tags=False, remove_unknown_tags=False, safe_attrs_only=False
+    )
+except ImportError:
+    lxml_html = None
+    _HTML_CLEANER = None
+
+# Characters XML (and so libxml2) can't hold: C0 controls other than \t \n \r
+_XML_INVALID_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Per-language text constraints, bound once instead of re-indexing Config per call
+_HEADLINE_CONSTRAINTS = Config.TEXT_CONSTRAINTS['headline']
+_DESCRIPTION_CONSTRAINTS = Config.TEXT_CONSTRAINTS['description']
+
+# Punctuation cleanup patterns (see _cleanup)
+_DASH_RE = re.compile(r'[—–−‒―⁻]')
+_DOUBLE_QUOTE_RE = re.compile(r'[""„‟❝❞]')
+_SINGLE_QUOTE_RE = re.compile(r'[''‚‛❛❜]')
+_MULTI_DOT_RE = re.compile(r'\.{2,}')
+_ELLIPSIS_RE = re.compile(r'…')
+_BULLET_RE = re.compile(r'[•·●○■□▪▫➤➢►▶]')
+_COPYRIGHT_RE = re.compile(r'[©®™℗]')
+_DEGREE_RE = re.compile(r'[°º]')
+_PERCENT_RE = re.compile(r'%')
+_AMPERSAND_RE = re.compile(r'&')
+_MATH_SYMBOL_RE = re.compile(r'[×÷±≈≠≤≥]')
+_SPACE_BEFORE_PUNCT_RE = re.compile(r'\s+([.,!?;:])')
+_NO_SPACE_AFTER_PUNCT_RE = re.compile(r'([.,!?;:])([A-Za-z])')
+_MULTI_SPACE_RE = re.compile(r'\s{2,}')
+
+# Ordinals, rupee amounts and bare integers, matched in a single scan so
+# currency amounts are consumed before the bare-number branch sees them
+_NUMBER_RE = re.compile(
+    r'(?i:\b(?P<ordinal>\d+)(?:st|nd|rd|th)\b)'
+    r'|Rs\.?\s*(?P<rupees>\d[\d,\.]*)'
+    r'|\b(?P<number>\d+)\b'
+)
+
+# Any markup tag, used to strip SSML on validation failure
+_TAG_STRIP_RE = re.compile(r'<[^>]+>')
+
+# Important words emphasized in English SSML output
+_EMPHASIS_CITIES = ('Karachi', 'Lahore', 'Islamabad', 'Pakistan', 'Chitral', 'Peshawar')
+
+# SSML tokens for English output: commas, sentence ends and emphasized cities
+_SSML_TOKEN_RE = re.compile(
+    r'(,)\s*|([.!?])\s*|\b(' + '|'.join(map(re.escape, _EMPHASIS_CITIES)) + r')\b',
+    re.IGNORECASE
+)
+
+class _KeepTable(dict):
+    """
+    str.translate table that keeps whitelisted characters and drops the rest.
+    Each code point is classified once and memoized on first lookup.
+    """
+    def __init__(self, keep, prefill=()):
+        super().__init__()
+        self._keep = keep
+        # Classify the code points we expect to see at import time
+        for codepoint in prefill:
+            self.__missing__(codepoint)
+
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        value = codepoint if char in self._keep or char.isspace() else None
+        self[codepoint] = value
+        return value
+
+# Language-specific character whitelists (whitespace is always kept)
+_EN_KEEP = frozenset(
+    'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789.,!?-'
+)
+_UR_KEEP = frozenset(
+    [chr(cp) for cp in range(0x0600, 0x0700)]
+    + [chr(cp) for cp in range(0x0750, 0x0780)]
+    + list('.,!?')
+)
+_COMMON_CODEPOINTS = [*range(0x80), *range(0x0600, 0x0700), *range(0x0750, 0x0780)]
+_EN_TABLE = _KeepTable(_EN_KEEP, prefill=_COMMON_CODEPOINTS)
+_UR_TABLE = _KeepTable(_UR_KEEP, prefill=_COMMON_CODEPOINTS)
+
+# Script/data/file URL schemes rejected by validate_url (schemes only occur at the start)
+_URL_BLOCKLIST_RE = re.compile(r'^\s*(?:javascript:|data:|vbscript:|file://)', re.IGNORECASE)
+
+# Markup tokens and the SSML tag vocabulary we generate ourselves
+_MARKUP_RE = re.compile(r'<[^<>]*>')
+_SSML_TAG_RE = re.compile(r'<(/?)(speak|break|emphasis)(\s[^>]*)?/?>')
+
 class ValidationError(Exception):
     """Custom exception for validation errors"""
     pass
@@ -21,35 +120,44 @@ def aggressive_punctuation_cleanup(text):
     CRITICAL FIX: Remove/normalize ALL punctuation that TTS engines might speak aloud.
     This runs BEFORE any SSML processing.
     """
+    return _cleanup(text)
+
+def _cleanup(text, *, already_unescaped=False):
+    """
+    Implementation of aggressive_punctuation_cleanup.
+    Pass already_unescaped=True when the text went through sanitize_html,
+    which has decoded HTML entities already.
+    """
     if not text:
         return ""
     
     # Step 1: Decode HTML entities first (critical for RSS feeds)
-    text = html.unescape(text)
+    if not already_unescaped:
+        text = html.unescape(text)
     
     # Step 2: Replace all types of dashes with simple hyphen or space
     # Em dash (—), en dash (–), minus (−), figure dash, horizontal bar → space
-    text = re.sub(r'[—–−‒―⁻]', ' ', text)
+    text = _DASH_RE.sub(' ', text)
     
     # Step 3: Normalize all types of quotes to straight quotes
-    text = re.sub(r'[""„‟❝❞]', '"', text)  # Double quotes
-    text = re.sub(r'[''‚‛❛❜]', "'", text)  # Single quotes
+    text = _DOUBLE_QUOTE_RE.sub('"', text)  # Double quotes
+    text = _SINGLE_QUOTE_RE.sub("'", text)  # Single quotes
     
     # Step 4: Remove ellipsis and multiple dots
-    text = re.sub(r'\.{2,}', '.', text)
-    text = re.sub(r'…', '.', text)
+    text = _MULTI_DOT_RE.sub('.', text)
+    text = _ELLIPSIS_RE.sub('.', text)
     
     # Step 5: Remove special bullets and list markers
-    text = re.sub(r'[•·●○■□▪▫➤➢►▶]', '', text)
+    text = _BULLET_RE.sub('', text)
     
     # Step 6: Remove or replace symbols that TTS might speak
-    text = re.sub(r'[©®™℗]', '', text)  # Copyright symbols
-    text = re.sub(r'[°º]', ' degrees ', text)  # Degree symbol
-    text = re.sub(r'%', ' percent ', text)  # Percent
-    text = re.sub(r'&', ' and ', text)  # Ampersand
+    text = _COPYRIGHT_RE.sub('', text)  # Copyright symbols
+    text = _DEGREE_RE.sub(' degrees ', text)  # Degree symbol
+    text = _PERCENT_RE.sub(' percent ', text)  # Percent
+    text = _AMPERSAND_RE.sub(' and ', text)  # Ampersand
     
     # Step 7: Clean mathematical/technical symbols
-    text = re.sub(r'[×÷±≈≠≤≥]', ' ', text)
+    text = _MATH_SYMBOL_RE.sub(' ', text)
     
     # Step 8: Remove brackets/parentheses content that might be citations
     # (optional - comment out if you want to keep parenthetical content)
@@ -57,38 +165,66 @@ def aggressive_punctuation_cleanup(text):
     # text = re.sub(r'\[[^\]]*\]', '', text)
     
     # Step 9: Normalize whitespace around punctuation
-    text = re.sub(r'\s+([.,!?;:])', r'\1', text)  # Remove space before punctuation
-    text = re.sub(r'([.,!?;:])([A-Za-z])', r'\1 \2', text)  # Add space after punctuation
+    text = _SPACE_BEFORE_PUNCT_RE.sub(r'\1', text)  # Remove space before punctuation
+    text = _NO_SPACE_AFTER_PUNCT_RE.sub(r'\1 \2', text)  # Add space after punctuation
     
     # Step 10: Clean multiple spaces
-    text = re.sub(r'\s{2,}', ' ', text)
+    text = _MULTI_SPACE_RE.sub(' ', text)
     
     return text.strip()
 
-@st.cache_data(ttl=3600)
+@functools.lru_cache(maxsize=1024)
 def format_headline(text, language='en'):
     """Enforce headline constraints with language-specific rules"""
-    constraints = Config.TEXT_CONSTRAINTS['headline'][language]
+    max_chars = _HEADLINE_CONSTRAINTS[language]['max_chars']
     clean_text = ' '.join(text.strip().split())
     clean_text = aggressive_punctuation_cleanup(clean_text)
-    truncated = smart_truncate(clean_text, constraints['max_chars'])
+    truncated = smart_truncate(clean_text, max_chars)
     return truncated.replace('\n', ' ').strip()
 
-@st.cache_data(ttl=3600)  
+@functools.lru_cache(maxsize=1024)
 def format_description(text, language='en'):
     """Format description into line-constrained paragraphs"""
-    constraints = Config.TEXT_CONSTRAINTS['description'][language]
+    constraints = _DESCRIPTION_CONSTRAINTS[language]
+    min_lines = constraints['min_lines']
+    max_lines = constraints['max_lines']
+    chars_per_line = constraints['chars_per_line']
     clean_text = ' '.join(text.strip().split())
     clean_text = aggressive_punctuation_cleanup(clean_text)
-    max_chars = constraints['max_lines'] * constraints['chars_per_line']
-    truncated = smart_truncate(clean_text, max_chars)
-    lines = textwrap.wrap(truncated, width=constraints['chars_per_line'])
-    if len(lines) < constraints['min_lines']:
-        lines += [''] * (constraints['min_lines'] - len(lines))
-    elif len(lines) > constraints['max_lines']:
-        lines = lines[:constraints['max_lines']]
+    truncated = smart_truncate(clean_text, max_lines * chars_per_line)
+    lines = _wrap_words(truncated, chars_per_line)
+    if len(lines) < min_lines:
+        lines += [''] * (min_lines - len(lines))
+    elif len(lines) > max_lines:
+        lines = lines[:max_lines]
     return '\n'.join(lines)
 
+def _wrap_words(text, width):
+    """
+    Greedy word wrap for plain space-separated text.
+    Matches textwrap.wrap for our input (long words are split at the line
+    width) without building a TextWrapper on every call. Lines only break
+    at spaces, never at hyphens.
+    """
+    lines = []
+    current = ''
+    for word in text.split():
+        if not current:
+            current = word
+        elif len(current) + 1 + len(word) <= width or len(word) > width:
+            current += ' ' + word
+        else:
+            lines.append(current)
+            current = word
+        # Split words longer than a full line across lines
+        while len(current) > width:
+            lines.append(current[:width].rstrip())
+            current = current[width:].lstrip()
+    if current:
+        lines.append(current)
+    return lines
+
+@st.cache_data(ttl=3600, max_entries=2048, show_spinner=False)
 def sanitize_html(text):
     """Remove HTML tags while preserving text content"""
     if not text:
@@ -98,6 +234,17 @@ def sanitize_html(text):
         # Decode HTML entities first
         text = html.unescape(text)
         
+        # libxml2 rejects or rewrites XML-invalid control characters, so
+        # such text takes the BeautifulSoup path unchanged
+        if _HTML_CLEANER is not None and not _XML_INVALID_RE.search(text):
+            try:
+                # Drop script/style/comments in libxml2, then keep only text
+                fragment = lxml_html.fragment_fromstring(text, create_parent='div')
+                fragment = _HTML_CLEANER.clean_html(fragment)
+                return ' '.join(s.strip() for s in fragment.itertext() if s.strip())
+            except Exception as e:
+                logger.debug(f"lxml sanitization failed, using BeautifulSoup: {e}")
+        
         soup = BeautifulSoup(text, "html.parser")
         # Remove all tags, keep only text
         text = soup.get_text(separator=' ', strip=True)
@@ -107,6 +254,34 @@ def sanitize_html(text):
         logger.error(f"HTML sanitization failed: {e}")
         return text
 
+@functools.lru_cache(maxsize=4096)
+def _num2words(n: int, to: str = 'cardinal', lang: str = 'en') -> str:
+    """Memoized num2words; news text repeats the same small integers constantly"""
+    return num2words(n, to=to, lang=lang)
+
+def _spell_number(match):
+    """Replacement callback for _NUMBER_RE, dispatching on the matched branch"""
+    ordinal, rupees, number = match.group('ordinal', 'rupees', 'number')
+
+    # Ordinal numbers (1st, 2nd, 3rd, etc.)
+    if ordinal is not None:
+        return _num2words(int(ordinal), to='ordinal')
+
+    # Currency (Rs. 1000 → one thousand rupees)
+    if rupees is not None:
+        return f"{_num2words(int(rupees.replace(',', '').split('.')[0]))} rupees"
+
+    # Convert small numbers (1-99) to words, but SKIP years (1900-2099)
+    num = int(number)
+    # Skip years
+    if 1900 <= num <= 2099:
+        return str(num)
+    # Skip large numbers (let TTS handle them naturally)
+    if num > 999:
+        return str(num)
+    # Convert small numbers
+    return _num2words(num)
+
 def normalize_numbers(text):
     """
     Convert numbers and currency to words SELECTIVELY.
@@ -116,40 +291,13 @@ def normalize_numbers(text):
         return text
 
     try:
-        # Ordinal numbers (1st, 2nd, 3rd, etc.)
-        text = re.sub(
-            r'\b(\d+)(?:st|nd|rd|th)\b',
-            lambda m: num2words(int(m.group(1)), to='ordinal'),
-            text,
-            flags=re.IGNORECASE
-        )
-        
-        # Currency (Rs. 1000 → one thousand rupees)
-        text = re.sub(
-            r'Rs\.?\s*(\d[\d,\.]*)',
-            lambda m: f"{num2words(int(m.group(1).replace(',', '').split('.')[0]))} rupees",
-            text
-        )
-        
-        # Convert small numbers (1-99) to words, but SKIP years (1900-2099)
-        def convert_number(match):
-            num = int(match.group())
-            # Skip years
-            if 1900 <= num <= 2099:
-                return str(num)
-            # Skip large numbers (let TTS handle them naturally)
-            if num > 999:
-                return str(num)
-            # Convert small numbers
-            return num2words(num)
-        
-        text = re.sub(r'\b\d+\b', convert_number, text)
-        
+        text = _NUMBER_RE.sub(_spell_number, text)
     except Exception as e:
         logger.error(f"Number normalization failed: {e}")
         pass
     return text
 
+@st.cache_data(ttl=3600, max_entries=2048, show_spinner=False)
 def prepare_for_tts(text, language='en', max_length=None):
     """
     FIXED VERSION: Clean text FIRST, then add SSML for engines that support it.
@@ -164,9 +312,12 @@ def prepare_for_tts(text, language='en', max_length=None):
     try:
         # STEP 1: AGGRESSIVE CLEANUP FIRST (before any SSML)
         text = text.replace('\n', ' ').strip()
-        text = sanitize_html(text)  # Remove HTML tags
-        text = aggressive_punctuation_cleanup(text)  # Clean special punctuation
-        text = normalize_numbers(text)  # Convert numbers to words
+        has_markup = '<' in text or '&' in text
+        if has_markup:
+            text = sanitize_html(text)  # Remove HTML tags
+        text = _cleanup(text, already_unescaped=has_markup)  # Clean special punctuation
+        if any(ch.isdigit() for ch in text):
+            text = normalize_numbers(text)  # Convert numbers to words
 
         # STEP 2: Basic validation
         if len(text) < 10:
@@ -176,13 +327,13 @@ def prepare_for_tts(text, language='en', max_length=None):
         # STEP 3: Language-specific character filtering
         if language == 'ur':
             # Keep Urdu characters, basic punctuation, and spaces only
-            text = re.sub(r'[^\u0600-\u06FF\u0750-\u077F\s.,!?]', '', text)
+            text = text.translate(_UR_TABLE)
         elif language == 'en':
             # Keep English alphanumeric, basic punctuation, and spaces only
-            text = re.sub(r'[^a-zA-Z0-9\s.,!?\-]', '', text)
+            text = text.translate(_EN_TABLE)
 
         # STEP 4: Final cleanup
-        text = re.sub(r'\s{2,}', ' ', text)
+        text = _MULTI_SPACE_RE.sub(' ', text)
         text = text.strip()
 
         # STEP 5: Truncate if needed
@@ -207,29 +358,35 @@ def add_natural_pauses(text):
     Add SSML breaks only for Edge TTS (English).
     Works on CLEAN text without special punctuation.
     """
-    # Short pause after commas
-    text = re.sub(r',\s*', ', <break time="300ms"/>', text)
-    
-    # Medium pause after sentence-ending punctuation
-    text = re.sub(r'([.!?])\s*', r'\1 <break time="500ms"/>', text)
-    
-    # Emphasize important words (cities example)
-    cities = ['Karachi', 'Lahore', 'Islamabad', 'Pakistan', 'Chitral', 'Peshawar']
-    for city in cities:
-        text = re.sub(
-            rf'\b({city})\b',
-            r'<emphasis level="moderate">\1</emphasis>',
-            text,
-            flags=re.IGNORECASE
-        )
+    parts = []
+    last = 0
+    for match in _SSML_TOKEN_RE.finditer(text):
+        parts.append(text[last:match.start()])
+        comma, punct, city = match.groups()
+        if comma:
+            # Short pause after commas
+            parts.append(', <break time="300ms"/>')
+        elif punct:
+            # Medium pause after sentence-ending punctuation
+            parts.append(f'{punct} <break time="500ms"/>')
+        else:
+            # Emphasize important words (cities example)
+            parts.append(f'<emphasis level="moderate">{city}</emphasis>')
+        last = match.end()
+    parts.append(text[last:])
     
-    return text
+    return ''.join(parts)
 
 def validate_ssml(ssml_content):
     """Ensure valid SSML structure (for Edge TTS only)"""
     if not ssml_content:
         return ""
 
+    # Fast path: with balanced brackets, drop any tag outside the SSML
+    # vocabulary in a single scan instead of building an XML tree
+    if ssml_content.count('<') == ssml_content.count('>'):
+        return _MARKUP_RE.sub(_allowed_ssml_tag, ssml_content)
+
     try:
         wrapped = f"<root>{ssml_content}</root>"
         root = ElementTree.fromstring(wrapped)
@@ -244,7 +401,12 @@ def validate_ssml(ssml_content):
     except ElementTree.ParseError as e:
         logger.error(f"SSML validation failed: {e}")
         # Strip all tags and return plain text as fallback
-        return re.sub(r'<[^>]+>', '', ssml_content)
+        return _TAG_STRIP_RE.sub('', ssml_content)
+
+def _allowed_ssml_tag(match):
+    """Keep speak/break/emphasis tags, strip everything else"""
+    tag = match.group()
+    return tag if _SSML_TAG_RE.fullmatch(tag) else ''
 
 def smart_truncate(text, max_length):
     """Enhanced truncation that preserves sentence structure"""
@@ -252,19 +414,20 @@ def smart_truncate(text, max_length):
         return text
 
     try:
-        # Try to find last sentence-ending punctuation within limits
-        last_punct = -1
-        for char in ['.', '!', '?']:
-            pos = text.rfind(char, 0, max_length)
-            if pos > last_punct:
-                last_punct = pos
-        
-        # If we found punctuation in the last 20% of allowed length, cut there
-        if last_punct != -1 and last_punct >= max_length * 0.8:
+        # Only punctuation in the last 20% of allowed length is a usable cut,
+        # so search just that window instead of the whole prefix
+        window_start = math.ceil(max_length * 0.8)
+        last_punct = max(
+            text.rfind('.', window_start, max_length),
+            text.rfind('!', window_start, max_length),
+            text.rfind('?', window_start, max_length)
+        )
+        if last_punct != -1:
             return text[:last_punct + 1]
 
         # Otherwise, cut at last complete word
-        truncated = text[:max_length].rsplit(' ', 1)[0]
+        last_space = text.rfind(' ', 0, max_length)
+        truncated = text[:last_space] if last_space != -1 else text[:max_length]
         return truncated + '.'
     except Exception as e:
         logger.error(f"Text truncation failed: {e}")
@@ -277,11 +440,8 @@ def validate_url(url: str) -> bool:
             return False
         if not validators.url(url):
             return False
-        
-        malicious_patterns = [r'javascript:', r'data:', r'vbscript:', r'file://']
-        for pattern in malicious_patterns:
-            if re.search(pattern, url, re.IGNORECASE):
-                return False
+        if _URL_BLOCKLIST_RE.match(url):
+            return False
         return True
     except Exception:
         return False
@@ -293,38 +453,70 @@ def validate_file_upload(file_obj, allowed_types: List[str] = None, max_size_mb:
     try:
         if not file_obj:
             return False, "No file uploaded"
-        file_size_mb = len(file_obj.getvalue()) / (1024 * 1024)
-        if file_size_mb > max_size_mb:
-            return False, f"File too large. Max: {max_size_mb}MB"
         file_extension = file_obj.name.split('.')[-1].lower()
         if file_extension not in allowed_types:
             return False, f"Invalid type. Allowed: {allowed_types}"
+        # UploadedFile exposes its size; avoid copying the bytes just to measure
+        file_size = getattr(file_obj, 'size', None)
+        if file_size is None:
+            # Plain file-like objects: measure by seeking to the end
+            position = file_obj.tell()
+            file_obj.seek(0, 2)
+            file_size = file_obj.tell()
+            file_obj.seek(position)
+        file_size_mb = file_size / (1024 * 1024)
+        if file_size_mb > max_size_mb:
+            return False, f"File too large. Max: {max_size_mb}MB"
         return True, "Valid"
     except Exception as e:
         return False, str(e)
 
-def validate_article_data(article: dict) -> Tuple[bool, str]:
-    """Validate article data"""
-    required_fields = ['title', 'description', 'source', 'category']
+_REQUIRED_ARTICLE_FIELDS = ('title', 'description', 'source', 'category')
+
+def _check_article(article: dict, is_safe) -> Tuple[bool, str]:
+    """Validate a single article against hoisted field list and safety check"""
     try:
-        for field in required_fields:
-            if field not in article or not article[field]:
+        for field in _REQUIRED_ARTICLE_FIELDS:
+            if not article.get(field):
                 return False, f"Missing {field}"
-        if not Config.is_content_safe(article['title']) or not Config.is_content_safe(article['description']):
+        if not is_safe(article['title']) or not is_safe(article['description']):
             return False, "Unsafe content"
         return True, "Valid"
     except Exception as e:
         return False, str(e)
 
+def validate_article_data(article: dict) -> Tuple[bool, str]:
+    """Validate article data"""
+    return _check_article(article, Config.is_content_safe)
+
+def validate_articles(articles: List[dict]) -> List[Tuple[bool, str]]:
+    """Validate a batch of articles in one pass"""
+    is_safe = Config.is_content_safe
+    return [_check_article(article, is_safe) for article in articles]
+
+def _is_rate_limited(exc) -> bool:
+    """True for HTTP 429 errors (requests/httpx/groq), checked without str(exc)"""
+    if getattr(exc, 'status_code', None) == 429:
+        return True
+    return getattr(getattr(exc, 'response', None), 'status_code', None) == 429
+
+def _retry_after(exc, attempt: int) -> float:
+    """Delay before retrying: the server's Retry-After, else exponential backoff"""
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return 5 * 2 ** attempt
+
 def rate_limit_handler(func):
     """Decorator to handle rate limiting"""
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        try:
-            return func(*args, **kwargs)
-        except Exception as e:
-            if "rate limit" in str(e).lower():
-                import time
-                time.sleep(5)
+        for attempt in range(Config.MAX_RETRY_ATTEMPTS):
+            try:
                 return func(*args, **kwargs)
-            raise
+            except Exception as e:
+                if not _is_rate_limited(e) or attempt == Config.MAX_RETRY_ATTEMPTS - 1:
+                    raise
+                time.sleep(_retry_after(e, attempt))
     return wrapper
\ No newline at end of file
@@ -1,237 +1,598 @@
+import atexit
 import subprocess
 import tempfile
 import os
+import errno
+import hashlib
 import shutil
 import time
+import json
+import sys
+import threading
+import queue
+import logging
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import streamlit as st
-from pydub import AudioSegment
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from config import Config
 
-def get_audio_duration(audio_path):
-    """Get audio duration with detailed error reporting"""
+logger = logging.getLogger(__name__)
+
+# Serializes jobs on the single Wav2Lip worker (it writes to shared temp files)
+# and guards _worker, the one worker process
+_worker_lock = threading.Lock()
+_worker = None
+
+# Resolved once at import; the app always runs from the repo root
+WAV2LIP_ROOT = os.path.abspath("Wav2Lip")
+CHECKPOINT_PATH = os.path.join(WAV2LIP_ROOT, "checkpoints", "wav2lip_gan.pth")
+
+def _stat_or_none(path):
+    """os.stat() result, or None if the path can't be stat'ed"""
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+# Set once the Wav2Lip checkpoint is known to be on disk; it is never removed
+# while the app runs, so later requests skip the stat() calls
+_CHECKPOINT_READY = False
+
+def _checkpoint_ready(checkpoint_path):
+    """Check for the Wav2Lip checkpoint, remembering a positive result"""
+    global _CHECKPOINT_READY
+    if not _CHECKPOINT_READY and os.path.exists(checkpoint_path):
+        _CHECKPOINT_READY = True
+    return _CHECKPOINT_READY
+
+# Upper bound for a metadata probe; a malformed file must not stall the request
+FFPROBE_TIMEOUT = 5
+
+def _probe_duration(audio_path):
+    """Read audio duration with ffprobe; returns None if ffprobe can't tell"""
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+             "-of", "default=nw=1:nk=1", audio_path],
+            capture_output=True,
+            text=True,
+            timeout=FFPROBE_TIMEOUT
+        )
+        value = result.stdout.strip()
+        if result.returncode != 0 or not value:
+            logger.warning("⚠️ ffprobe could not read duration: %s", result.stderr.strip()[:200])
+            return None
+        return float(value)
+    except (OSError, subprocess.TimeoutExpired, ValueError) as e:
+        logger.warning("⚠️ ffprobe duration probe failed: %s", e)
+        return None
+
+def convert_audio_for_wav2lip(input_path, output_path):
+    """
+    Convert audio to the 16kHz mono WAV Wav2Lip consumes, in one ffmpeg call.
+    Handing Wav2Lip a ready WAV skips its own ffmpeg extraction and the
+    librosa resample on load.
+    """
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-i", input_path,
+             "-ar", "16000", "-ac", "1", "-f", "wav", output_path],
+            capture_output=True,
+            text=True
+        )
+        if result.returncode != 0:
+            logger.warning("⚠️ Audio conversion failed: %s", result.stderr[:500])
+            return False
+        return True
+    except OSError as e:
+        logger.warning("⚠️ Audio conversion failed: %s", e)
+        return False
+
+# Accepted audio containers, by leading bytes
+_MAGIC = (
+    (b"ID3", "mp3"),
+    (b"OggS", "ogg"),
+    (b"fLaC", "flac"),
+)
+
+def _sniff_audio_format(header):
+    """Audio format from the first 12 bytes of a file, or None if unknown"""
+    for magic, fmt in _MAGIC:
+        if header.startswith(magic):
+            return fmt
+    # MP3 without an ID3 tag starts with an 11-bit frame sync, for every
+    # MPEG version and CRC flag (edge-tts/gTTS emit MPEG-2 0xFFF3 frames)
+    if len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0:
+        return "mp3"
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "wav"
+    if header[4:8] == b"ftyp":
+        return "mp4"
+    return None
+
+@lru_cache(maxsize=None)
+def _ffmpeg_encoders():
+    """Encoder names this ffmpeg build offers; empty if ffmpeg is missing"""
     try:
-        print(f"🔍 Validating audio file: {audio_path}")
+        output = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-encoders"],
+            capture_output=True, text=True, timeout=FFPROBE_TIMEOUT
+        ).stdout
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning("⚠️ ffmpeg encoder probe failed: %s", e)
+        return frozenset()
+    # Listing follows a " ------" separator: " V....D libx264   description"
+    _, _, listing = output.partition("------")
+    return frozenset(
+        line.split()[1] for line in listing.splitlines() if len(line.split()) > 1
+    )
+
+def _encoder_works(encoder):
+    """Listed hardware encoders can still lack a device; try a tiny encode"""
+    try:
+        return subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error",
+             "-f", "lavfi", "-i", "color=s=256x256:d=0.1",
+             "-c:v", encoder, "-f", "null", "-"],
+            capture_output=True, timeout=FFPROBE_TIMEOUT
+        ).returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+@lru_cache(maxsize=None)
+def preferred_encoder():
+    """
+    H.264 encoder for the final mux: NVENC when usable, else libx264. None
+    when the build has neither, leaving the choice to ffmpeg's default.
+    """
+    encoders = _ffmpeg_encoders()
+    if "h264_nvenc" in encoders and _encoder_works("h264_nvenc"):
+        return "h264_nvenc"
+    if "libx264" in encoders:
+        return "libx264"
+    return None
+
+@lru_cache(maxsize=128)
+def _cached_duration(audio_path, mtime_ns, size):
+    """
+    Duration for one version of a file. mtime_ns and size are only part of
+    the cache key: a rewritten file gets a new entry.
+    """
+    # Read duration from the container header (no full decode)
+    logger.debug("Probing audio with ffprobe...")
+    duration = _probe_duration(audio_path)
+    
+    if duration is None:
+        raise ValueError("ffprobe could not read the audio duration")
+    
+    return duration
+
+def get_audio_duration(audio_path, file_stat=None):
+    """
+    Get audio duration with detailed error reporting. Callers that already
+    stat'ed the file can pass the result to skip a second stat.
+    """
+    try:
+        logger.info("🔍 Validating audio file: %s", audio_path)
         
         # Check file exists
-        if not os.path.exists(audio_path):
-            print(f"❌ Audio file does not exist: {audio_path}")
+        if file_stat is None:
+            file_stat = _stat_or_none(audio_path)
+        if file_stat is None:
+            logger.error("❌ Audio file does not exist: %s", audio_path)
             st.error(f"Audio file not found: {audio_path}")
             return 0
         
         # Check file size
-        file_size = os.path.getsize(audio_path)
-        print(f"   File size: {file_size} bytes")
+        file_size = file_stat.st_size
+        logger.debug("File size: %s bytes", file_size)
         
         if file_size == 0:
-            print(f"❌ Audio file is empty")
+            logger.error("❌ Audio file is empty")
             st.error("Audio file is empty (0 bytes)")
             return 0
         
         if file_size < 1000:
-            print(f"⚠️ Audio file is suspiciously small ({file_size} bytes)")
+            logger.warning("⚠️ Audio file is suspiciously small (%s bytes)", file_size)
             st.warning(f"Audio file is very small ({file_size} bytes) - may be invalid")
         
-        # Check file header/magic bytes
-        try:
-            with open(audio_path, 'rb') as f:
-                header = f.read(12)
-                print(f"   File header: {header[:8].hex()}")
-                
-                # MP3 files start with ID3 or 0xFF 0xFB
-                # AAC/M4A files start with ftyp
-                is_valid = (header.startswith(b'ID3') or 
-                           header.startswith(b'\xff\xfb') or
-                           b'ftyp' in header)
-                
-                if not is_valid:
-                    print(f"⚠️ File may not be valid audio (unexpected header)")
-                    st.warning("Audio file format may be invalid")
-        except Exception as e:
-            print(f"⚠️ Could not read file header: {e}")
+        # Check file header/magic bytes before any subprocess sees the file
+        with open(audio_path, 'rb') as f:
+            header = f.read(12)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("File header: %s", header[:8].hex())
         
-        # Try to load with pydub
-        print(f"   Loading audio with pydub...")
-        audio = AudioSegment.from_file(audio_path)
-        duration = len(audio) / 1000
+        audio_format = _sniff_audio_format(header)
+        if audio_format is None:
+            logger.error("❌ Unrecognized audio format (header %s)", header[:8].hex())
+            st.error("The file exists but is not a valid audio format")
+            return 0
+        logger.debug("Format: %s", audio_format)
+        
+        # Cached per file version, so reruns on the same audio skip the probe
+        duration = _cached_duration(
+            os.path.abspath(audio_path), file_stat.st_mtime_ns, file_size
+        )
         
-        print(f"✅ Audio validated: {duration:.2f}s duration")
-        print(f"   Channels: {audio.channels}")
-        print(f"   Frame rate: {audio.frame_rate}Hz")
-        print(f"   Sample width: {audio.sample_width} bytes")
+        logger.info("✅ Audio validated: %.2fs duration", duration)
         
         return duration
         
     except FileNotFoundError as e:
-        print(f"❌ Audio file not found: {e}")
+        logger.error("❌ Audio file not found: %s", e)
         st.error(f"Audio file not found: {audio_path}")
         return 0
     except Exception as e:
-        print(f"❌ Audio validation failed: {e}")
+        logger.error("❌ Audio validation failed: %s", e)
         st.error(f"Audio validation failed: {str(e)}")
-        
-        # Try to provide more specific error info
-        if "does not appear to be" in str(e).lower():
-            st.error("The file exists but is not a valid audio format")
-        elif "codec" in str(e).lower():
-            st.error("Audio codec not supported - file may be corrupted")
-        
         return 0
 
+def _link_or_copy(src, dst):
+    """Hardlink src to dst (no bytes moved), copying across filesystems"""
+    try:
+        os.link(src, dst)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            raise
+        shutil.copy(src, dst)
+
+# Lines of worker log kept for error reports
+STDERR_TAIL_LINES = 200
+
+# Worker startup (torch import, checkpoint load, torch.compile) can take
+# minutes on a cold GPU host; it is timed separately from each job
+WORKER_STARTUP_TIMEOUT = 900
+
+def _pump_stderr(stream, tail):
+    """Echo the worker's log while keeping only its last lines in memory"""
+    for line in stream:
+        tail.append(line)
+        sys.stderr.write(line)
+
+def _pump_stdout(stream, lines):
+    """Queue the worker's response lines; "" marks EOF"""
+    for line in stream:
+        lines.put(line)
+    lines.put("")
+
+def _stop_wav2lip_worker():
+    """Kill the current worker, if any. Caller holds _worker_lock"""
+    global _worker
+    if _worker is not None:
+        if _worker.poll() is None:
+            _worker.kill()
+        _worker.wait()
+        _worker = None
+
+def _get_wav2lip_worker():
+    """
+    The long-lived Wav2Lip worker, which loads the model once. Caller holds
+    _worker_lock; a dead worker is reaped and replaced, so at most one
+    process ever holds the model.
+    """
+    global _worker
+    if _worker is not None and _worker.poll() is None:
+        return _worker
+    # Worker exited (crash, OOM kill) - start a fresh one
+    _stop_wav2lip_worker()
+
+    logger.info("🚀 Starting Wav2Lip worker...")
+    worker = subprocess.Popen(
+        ["python", os.path.join(WAV2LIP_ROOT, "wav2lip_worker.py"), CHECKPOINT_PATH],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        bufsize=1
+    )
+    worker.stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+    # Set once the worker's {"ready": true} line has been read
+    worker.ready = False
+    threading.Thread(
+        target=_pump_stderr, args=(worker.stderr, worker.stderr_tail), daemon=True
+    ).start()
+    # Read responses on a thread too: select() doesn't work on pipes on Windows
+    worker.stdout_lines = queue.Queue()
+    threading.Thread(
+        target=_pump_stdout, args=(worker.stdout, worker.stdout_lines), daemon=True
+    ).start()
+    _worker = worker
+    return worker
+
+@atexit.register
+def _kill_wav2lip_worker():
+    # No lock here: a job may still hold it while the interpreter exits
+    if _worker is not None and _worker.poll() is None:
+        _worker.kill()
+
+def warm_up_wav2lip():
+    """Start the worker early so torch import and model load overlap other work"""
+    if not _checkpoint_ready(CHECKPOINT_PATH):
+        return
+    # A held lock means a job is running, so the worker is already up
+    if _worker_lock.acquire(blocking=False):
+        try:
+            _get_wav2lip_worker()
+        finally:
+            _worker_lock.release()
+
+def _read_worker_line(worker, timeout):
+    """Next stdout line from the worker ("" on EOF), or TimeoutExpired"""
+    try:
+        return worker.stdout_lines.get(timeout=timeout)
+    except queue.Empty:
+        raise subprocess.TimeoutExpired(worker.args, timeout)
+
+def _worker_error(worker, message):
+    """CalledProcessError carrying the worker's recent log"""
+    return subprocess.CalledProcessError(
+        1, worker.args, stderr=f"{message}\n" + "".join(worker.stderr_tail)
+    )
+
+def _run_wav2lip_job(job, timeout):
+    """Send one job to the Wav2Lip worker and wait for its JSON result line"""
+    with _worker_lock:
+        worker = _get_wav2lip_worker()
+
+        # Tail only covers the current job
+        worker.stderr_tail.clear()
+        try:
+            line = None
+            if not worker.ready:
+                # Model load and compilation don't count against the job timeout
+                line = _read_worker_line(worker, WORKER_STARTUP_TIMEOUT)
+                worker.ready = bool(line) and json.loads(line).get("ready", False)
+                if line and not worker.ready:
+                    raise ValueError(f"unexpected startup line {line.strip()!r}")
+            if worker.ready:
+                worker.stdin.write(json.dumps(job) + "\n")
+                worker.stdin.flush()
+                line = _read_worker_line(worker, timeout)
+        except (subprocess.TimeoutExpired, OSError):
+            # A stuck or broken worker can't take further jobs
+            _stop_wav2lip_worker()
+            raise
+        except ValueError as e:
+            # Bad startup line: the response channel can't be trusted
+            _stop_wav2lip_worker()
+            raise _worker_error(worker, f"Invalid Wav2Lip worker response: {e}")
+
+        if not line:
+            returncode = worker.wait()
+            _stop_wav2lip_worker()
+            raise subprocess.CalledProcessError(
+                returncode, worker.args,
+                stderr="Wav2Lip worker exited unexpectedly\n" + "".join(worker.stderr_tail)
+            )
+
+        try:
+            result = json.loads(line)
+        except ValueError as e:
+            _stop_wav2lip_worker()
+            raise _worker_error(worker, f"Invalid Wav2Lip worker response: {e}")
+        if not result.get("ok"):
+            raise _worker_error(worker, result.get("error"))
+    return result
+
+# Recycled per-language work dirs, so each video doesn't mkdir/rmdir its own
+WORKDIR_POOL_SIZE = 2
+_workdir_pool = {}
+
+def _clear_dir(path):
+    for name in os.listdir(path):
+        entry = os.path.join(path, name)
+        if os.path.isdir(entry) and not os.path.islink(entry):
+            shutil.rmtree(entry)
+        else:
+            os.unlink(entry)
+
+@contextmanager
+def _workdir(lang):
+    """Working directory from the language's pool, emptied and returned on exit"""
+    pool = _workdir_pool.setdefault(lang, queue.Queue(maxsize=WORKDIR_POOL_SIZE))
+    try:
+        path = pool.get_nowait()
+    except queue.Empty:
+        path = tempfile.mkdtemp(prefix=f"video_{lang}_")
+    try:
+        yield path
+    finally:
+        try:
+            _clear_dir(path)
+            pool.put_nowait(path)
+        except (OSError, queue.Full):
+            shutil.rmtree(path, ignore_errors=True)
+
+@atexit.register
+def _remove_workdirs():
+    # Pooled dirs come from mkdtemp, so nothing else deletes them
+    for pool in list(_workdir_pool.values()):
+        while True:
+            try:
+                path = pool.get_nowait()
+            except queue.Empty:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+
+def _remove_partial_output(path):
+    """Wav2Lip writes straight into outputs/; don't leave a failed result there"""
+    if path is None:
+        return
+    try:
+        os.remove(path)
+        logger.debug("Removed partial output: %s", path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning("⚠️ Could not remove partial output %s: %s", path, e)
+
 def generate_video(audio_path, avatar_input, lang, is_auto_generated=False):
     """Generate video with enhanced error handling and validation"""
+    final_output = None
     try:
-        print(f"\n{'='*80}")
-        print(f"🎥 VIDEO GENERATION STARTED")
-        print(f"{'='*80}")
-        print(f"   Audio: {audio_path}")
-        print(f"   Language: {lang}")
-        print(f"   Auto-generated avatar: {is_auto_generated}")
+        logger.info("🎥 VIDEO GENERATION STARTED")
+        logger.debug("Audio: %s", audio_path)
+        logger.debug("Language: %s", lang)
+        logger.debug("Auto-generated avatar: %s", is_auto_generated)
         
         # Validate inputs
         if not audio_path:
             error_msg = "No audio file path provided"
-            print(f"❌ {error_msg}")
+            logger.error("❌ %s", error_msg)
             st.error(error_msg)
             return None
         
-        if not os.path.exists(audio_path):
+        audio_stat = _stat_or_none(audio_path)
+        if audio_stat is None:
             error_msg = f"Audio file does not exist: {audio_path}"
-            print(f"❌ {error_msg}")
+            logger.error("❌ %s", error_msg)
             st.error(error_msg)
             
             # List files in the directory to help debug
             audio_dir = os.path.dirname(audio_path)
             if os.path.exists(audio_dir):
                 files = os.listdir(audio_dir)
-                print(f"   Files in {audio_dir}: {files}")
+                logger.debug("Files in %s: %s", audio_dir, files)
                 st.code(f"Files in audio directory: {files}")
             
             return None
 
         if not avatar_input:
             error_msg = "No avatar provided"
-            print(f"❌ {error_msg}")
+            logger.error("❌ %s", error_msg)
             st.error(error_msg)
             return None
 
-        # Language-specific temporary directory
-        with tempfile.TemporaryDirectory(prefix=f"video_{lang}_") as tmpdir:
-            print(f"   Temp directory: {tmpdir}")
+        # Language-specific working directory from the pool
+        # (the executor is shut down before the directory is cleared)
+        with _workdir(lang) as tmpdir, \
+                ThreadPoolExecutor(max_workers=1) as executor:
+            logger.debug("Temp directory: %s", tmpdir)
             
             # Unique filenames with timestamp
             timestamp = str(int(time.time()))
             face_path = os.path.join(tmpdir, f"anchor_{lang}_{timestamp}.png")
-            output_path = os.path.join(tmpdir, f"output_{lang}_{timestamp}.mp4")
+            wav_path = os.path.join(tmpdir, f"audio_{lang}_{timestamp}.wav")
+            # Random suffix: batched jobs for one language can start in the same second
             final_output = os.path.abspath(
-                os.path.join("outputs", f"{lang}_broadcast_{timestamp}.mp4")
+                os.path.join("outputs", f"{lang}_broadcast_{timestamp}_{uuid.uuid4().hex[:8]}.mp4")
             )
 
+            # Convert audio to 16kHz mono WAV in the background while the
+            # avatar, checkpoint and audio duration are prepared and checked
+            conversion = executor.submit(convert_audio_for_wav2lip, audio_path, wav_path)
+
             # Handle different avatar sources
-            print(f"   Processing avatar...")
+            logger.debug("Processing avatar...")
             if isinstance(avatar_input, str):  # Auto-generated
                 if not os.path.exists(avatar_input):
                     error_msg = f"Avatar file not found: {avatar_input}"
-                    print(f"❌ {error_msg}")
+                    logger.error("❌ %s", error_msg)
                     st.error(error_msg)
                     return None
-                shutil.copy(avatar_input, face_path)
-                print(f"   ✅ Avatar copied from: {avatar_input}")
+                _link_or_copy(avatar_input, face_path)
+                logger.debug("✅ Avatar linked from: %s", avatar_input)
             else:  # User upload
                 try:
+                    # Stream the upload to disk instead of materializing a second copy
+                    avatar_input.seek(0)
                     with open(face_path, "wb") as f:
-                        f.write(avatar_input.getbuffer())
-                    print(f"   ✅ Avatar saved from upload")
+                        shutil.copyfileobj(avatar_input, f, 1024 * 1024)
+                    logger.debug("✅ Avatar saved from upload")
                 except Exception as e:
                     error_msg = f"Failed to save avatar: {str(e)}"
-                    print(f"❌ {error_msg}")
+                    logger.error("❌ %s", error_msg)
                     st.error(error_msg)
                     return None
 
             # Validate critical paths
-            wav2lip_root = os.path.abspath("Wav2Lip")
-            checkpoint_path = os.path.join(wav2lip_root, "checkpoints", "wav2lip_gan.pth")
-
-            if not os.path.exists(checkpoint_path):
-                error_msg = f"Missing Wav2Lip checkpoint: {checkpoint_path}"
-                print(f"❌ {error_msg}")
+            if not _checkpoint_ready(CHECKPOINT_PATH):
+                error_msg = f"Missing Wav2Lip checkpoint: {CHECKPOINT_PATH}"
+                logger.error("❌ %s", error_msg)
                 st.error(error_msg)
                 return None
 
             # Check audio duration with detailed validation
-            print(f"\n   Validating audio file...")
-            duration = get_audio_duration(audio_path)
+            logger.debug("Validating audio file...")
+            duration = get_audio_duration(audio_path, audio_stat)
             if duration == 0:
                 error_msg = "Invalid audio file - unable to determine duration"
-                print(f"❌ {error_msg}")
+                logger.error("❌ %s", error_msg)
                 st.error(error_msg)
                 
                 # Try to show what went wrong
-                st.code(f"Audio path: {audio_path}\nFile exists: {os.path.exists(audio_path)}")
+                st.code(f"Audio path: {audio_path}\nFile size: {audio_stat.st_size} bytes")
                 return None
 
             if duration > Config.VIDEO_TIMEOUT:
                 warning_msg = f"Audio too long ({duration:.1f}s). Video generation may timeout."
-                print(f"⚠️ {warning_msg}")
+                logger.warning("⚠️ %s", warning_msg)
                 st.warning(warning_msg)
 
-            # Build Wav2Lip command with better error handling
-            print(f"\n   Building Wav2Lip command...")
-            cmd = [
-                "python", os.path.join(wav2lip_root, "inference.py"),
-                "--checkpoint_path", checkpoint_path,
-                "--face", face_path,
-                "--audio", os.path.abspath(audio_path),
-                "--outfile", output_path,
-                "--pads", "0", "20", "0", "0"
-            ]
-            print(f"   Command: {' '.join(cmd)}")
-
-            # Execute with timeout and full environment
-            print(f"\n   Running Wav2Lip (timeout: {Config.VIDEO_TIMEOUT * 2}s)...")
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                check=True,
-                env=os.environ.copy(),
-                timeout=Config.VIDEO_TIMEOUT * 2
-            )
-
-            if result.stdout:
-                print(f"   Wav2Lip stdout: {result.stdout[:500]}")
-            if result.stderr:
-                print(f"   Wav2Lip stderr: {result.stderr[:500]}")
+            # Wait for the audio conversion (falls back to the original file)
+            if conversion.result():
+                wav2lip_audio = wav_path
+                logger.debug("✅ Audio converted for Wav2Lip: %s", wav_path)
+            else:
+                wav2lip_audio = os.path.abspath(audio_path)
+
+            # Build Wav2Lip job for the persistent worker
+            logger.debug("Building Wav2Lip job...")
+            job = {
+                "checkpoint_path": CHECKPOINT_PATH,
+                "face": face_path,
+                "audio": wav2lip_audio,
+                "outfile": final_output,
+                "pads": [0, 20, 0, 0],
+                # Half precision on CUDA; the worker stays fp32 on CPU
+                "fp16": True
+            }
+            encoder = preferred_encoder()
+            if encoder:
+                job["vcodec"] = encoder
+            logger.debug("Job: %s", job)
+
+            # Wav2Lip muxes straight into outputs/, so there is no copy out of tmpdir
+            os.makedirs(os.path.dirname(final_output), exist_ok=True)
+
+            # Execute on the warm worker with timeout
+            logger.debug("Running Wav2Lip (timeout: %ss)...", Config.VIDEO_TIMEOUT * 2)
+            _run_wav2lip_job(job, timeout=Config.VIDEO_TIMEOUT * 2)
 
             # Final output handling
-            if os.path.exists(output_path):
-                os.makedirs(os.path.dirname(final_output), exist_ok=True)
-                shutil.copy(output_path, final_output)
-
+            output_stat = _stat_or_none(final_output)
+            if output_stat is not None:
                 # Verify output
-                if os.path.exists(final_output) and os.path.getsize(final_output) > 0:
-                    video_size = os.path.getsize(final_output)
-                    print(f"✅ Video generated successfully: {final_output} ({video_size} bytes)")
+                video_size = output_stat.st_size
+                if video_size > 0:
+                    logger.info("✅ Video generated successfully: %s (%s bytes)", final_output, video_size)
                     st.success(f"Video generated successfully: {final_output}")
                     return final_output
                 else:
                     error_msg = "Video generation completed but output file is invalid"
-                    print(f"❌ {error_msg}")
+                    logger.error("❌ %s", error_msg)
                     st.error(error_msg)
+                    _remove_partial_output(final_output)
                     return None
             else:
-                error_msg = f"Video file was not created at {output_path}"
-                print(f"❌ {error_msg}")
+                error_msg = f"Video file was not created at {final_output}"
+                logger.error("❌ %s", error_msg)
                 st.error(error_msg)
                 return None
 
-    except subprocess.TimeoutExpired:
-        error_msg = f"Video generation timed out after {Config.VIDEO_TIMEOUT * 2} seconds"
-        print(f"⏰ {error_msg}")
+    except subprocess.TimeoutExpired as e:
+        error_msg = f"Video generation timed out after {e.timeout} seconds"
+        logger.error("⏰ %s", error_msg)
         st.error(error_msg)
+        _remove_partial_output(final_output)
         return None
     except subprocess.CalledProcessError as e:
         error_msg = f"Video processing failed: {e.stderr}"
-        print(f"❌ {error_msg}")
+        logger.error("❌ %s", error_msg)
         st.error(error_msg)
         
         # Show more details
@@ -240,74 +601,192 @@ def generate_video(audio_path, avatar_input, lang, is_auto_generated=False):
         if e.stderr:
             st.code(f"Stderr: {e.stderr}")
         
+        _remove_partial_output(final_output)
         return None
     except Exception as e:
         error_msg = f"Video generation error: {str(e)}"
-        print(f"❌ {error_msg}")
+        logger.exception("❌ %s", error_msg)
         st.error(error_msg)
         
-        import traceback
-        traceback.print_exc()
-        
+        _remove_partial_output(final_output)
         return None
 
+# Avatar paths never change at runtime, so snapshot them once at import
+_AUTO_AVATAR_ITEMS = frozenset(Config.AUTO_AVATARS.items())
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _requirements_state():
+    """
+    Filesystem side of the requirements check: (checkpoint_ok, missing_avatars).
+    Cached so widget reruns don't re-stat everything.
+    """
+    checkpoint_ok = _checkpoint_ready(CHECKPOINT_PATH)
+
+    missing_avatars = [
+        f"{lang}: {avatar_path}"
+        for lang, avatar_path in sorted(_AUTO_AVATAR_ITEMS)
+        if not os.path.exists(avatar_path)
+    ]
+
+    # Check output directory
+    Config().OUTPUT_DIR.mkdir(exist_ok=True)
+
+    return checkpoint_ok, missing_avatars
+
+def generate_videos(jobs):
+    """
+    Generate several videos (e.g. one per language) against the same warm
+    Wav2Lip worker. Each job is a tuple of generate_video arguments:
+    (audio_path, avatar_input, lang[, is_auto_generated]). Returns the output
+    paths in job order, with None for jobs that failed.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return []
+
+    warm_up_wav2lip()
+
+    with tempfile.TemporaryDirectory(prefix="avatars_") as avatar_dir:
+        # Save each distinct upload once; jobs then hardlink it into their
+        # own work dir instead of sharing one file object across threads
+        saved_uploads = {}
+        resolved_jobs = []
+        for audio_path, avatar_input, *rest in jobs:
+            if avatar_input and not isinstance(avatar_input, str):
+                key = id(avatar_input)
+                if key not in saved_uploads:
+                    upload_path = os.path.join(avatar_dir, f"upload_{len(saved_uploads)}.png")
+                    avatar_input.seek(0)
+                    with open(upload_path, "wb") as f:
+                        shutil.copyfileobj(avatar_input, f, 1024 * 1024)
+                    saved_uploads[key] = upload_path
+                avatar_input = saved_uploads[key]
+            resolved_jobs.append((audio_path, avatar_input, *rest))
+
+        # Pool threads report through the caller's session; without its
+        # ScriptRunContext their st.error/st.success calls are dropped
+        ctx = get_script_run_ctx()
+
+        def run(job):
+            add_script_run_ctx(threading.current_thread(), ctx)
+            return generate_video(*job)
+
+        # Audio conversion and validation overlap; the worker lock queues Wav2Lip
+        workers = min(Config.MAX_CONCURRENT_JOBS, len(resolved_jobs))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(run, resolved_jobs))
+
 def validate_video_requirements():
     """Check if all video generation requirements are met"""
     try:
-        print("\n🔍 Validating video requirements...")
-        
+        logger.info("🔍 Validating video requirements...")
+        checkpoint_ok, missing_avatars = _requirements_state()
+
         # Check Wav2Lip checkpoint
-        checkpoint_path = "Wav2Lip/checkpoints/wav2lip_gan.pth"
-        if not os.path.exists(checkpoint_path):
-            print(f"⚠️ Missing Wav2Lip checkpoint: {checkpoint_path}")
-            st.warning(f"Missing Wav2Lip checkpoint: {checkpoint_path}")
+        if not checkpoint_ok:
+            logger.warning("⚠️ Missing Wav2Lip checkpoint: %s", CHECKPOINT_PATH)
+            st.warning(f"Missing Wav2Lip checkpoint: {CHECKPOINT_PATH}")
             st.info("The model will be downloaded automatically on first use (~436MB)")
             st.info("This may take several minutes. Please wait and try again.")
             return False
         else:
-            print(f"✅ Wav2Lip checkpoint found")
+            logger.info("✅ Wav2Lip checkpoint found")
 
         # Check avatar files
-        missing_avatars = []
-        for lang, avatar_path in Config.AUTO_AVATARS.items():
-            if not os.path.exists(avatar_path):
-                print(f"❌ Missing avatar for {lang}: {avatar_path}")
-                missing_avatars.append(f"{lang}: {avatar_path}")
-            else:
-                print(f"✅ Avatar found for {lang}")
-        
         if missing_avatars:
+            logger.error("❌ Missing avatars: %s", missing_avatars)
             st.error(f"Missing avatars: {', '.join(missing_avatars)}")
             return False
+        logger.info("✅ Avatars found")
 
-        # Check output directory
-        config = Config()
-        config.OUTPUT_DIR.mkdir(exist_ok=True)
-        print(f"✅ Output directory ready")
+        # Wav2Lip muxes the result with ffmpeg; fail before a long inference
+        if not _ffmpeg_encoders():
+            logger.error("❌ ffmpeg not found")
+            st.error("ffmpeg is required for video generation but was not found")
+            return False
+        logger.info("✅ ffmpeg found (video encoder: %s)", preferred_encoder() or "ffmpeg default")
+        logger.info("✅ Output directory ready")
 
         return True
         
     except Exception as e:
         error_msg = f"Video requirements check failed: {str(e)}"
-        print(f"❌ {error_msg}")
+        logger.error("❌ %s", error_msg)
         st.error(error_msg)
         return False
 
+MIRROR_PROBE_TIMEOUT = 3
+
+# requests is only needed for the one-time model download, so it is imported
+# lazily there rather than on every app start
+
+def _download_session(retry=True):
+    """
+    Pooled session. With retry, connects and 5xx responses are retried with
+    backoff; probes pass retry=False so a dead mirror costs one timeout.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=4,
+        max_retries=(
+            Retry(total=3, backoff_factor=1, status_forcelist=(500, 502, 503, 504))
+            if retry else 0
+        )
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # Identity encoding keeps Content-Length equal to the bytes we write
+    session.headers['Accept-Encoding'] = 'identity'
+    return session
+
+def _head_latency(session, url):
+    """Time a HEAD request to a mirror; None if it is unreachable"""
+    import requests
+
+    start = time.monotonic()
+    try:
+        response = session.head(url, timeout=MIRROR_PROBE_TIMEOUT, allow_redirects=True)
+        response.raise_for_status()
+    except requests.RequestException:
+        return None
+    return time.monotonic() - start
+
+def _rank_mirrors(session, urls):
+    """Order mirrors fastest-first by probing them in parallel"""
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        latencies = list(executor.map(lambda url: _head_latency(session, url), urls))
+    # Mirrors that failed the probe are still tried, just last
+    ranked = sorted(
+        zip(urls, latencies),
+        key=lambda item: (item[1] is None, item[1] or 0)
+    )
+    return [url for url, _ in ranked]
+
 def ensure_wav2lip_model():
     """Ensure Wav2Lip model is available, download if necessary"""
-    checkpoint_path = "Wav2Lip/checkpoints/wav2lip_gan.pth"
+    checkpoint_path = CHECKPOINT_PATH
 
-    if os.path.exists(checkpoint_path):
-        print(f"✅ Wav2Lip model already exists")
+    if _checkpoint_ready(checkpoint_path):
+        logger.info("✅ Wav2Lip model already exists")
         return True
 
-    try:
-        import requests
-        import tempfile
-        import shutil
+    import requests
+
+    # A dropped connection mid-stream; these are resumed with a Range request
+    resumable_errors = (
+        requests.ConnectionError,
+        requests.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+    )
 
+    try:
         st.info("📥 Downloading Wav2Lip model (~436MB). This may take several minutes...")
-        print("📥 Starting Wav2Lip model download...")
+        logger.info("📥 Starting Wav2Lip model download...")
 
         # Create directory
         os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
@@ -318,61 +797,123 @@ def ensure_wav2lip_model():
             "https://github.com/Rudrabha/Wav2Lip/releases/download/v1.0/wav2lip_gan.pth"
         ]
 
+        # Race the mirrors so a slow one isn't tried first; no retries, so
+        # the ranking waits at most one probe timeout per mirror
+        with _download_session(retry=False) as probe_session:
+            download_urls = _rank_mirrors(probe_session, download_urls)
+
+        session = _download_session()
+        expected_sha256 = Config.WAV2LIP_CHECKPOINT_SHA256
+
         for url_idx, url in enumerate(download_urls):
             try:
-                print(f"   Trying mirror {url_idx + 1}/{len(download_urls)}...")
-                response = requests.get(url, stream=True, timeout=30)
-                
-                if response.status_code == 200:
-                    total_size = int(response.headers.get('content-length', 0))
-                    print(f"   Total size: {total_size / (1024*1024):.1f} MB")
-
-                    with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-                        downloaded = 0
-                        last_percent = -1
-                        
-                        for chunk in response.iter_content(chunk_size=8192):
-                            if chunk:
-                                tmp_file.write(chunk)
-                                downloaded += len(chunk)
-
-                                if total_size > 0:
-                                    progress = (downloaded / total_size) * 100
-                                    # Only update display every 5%
-                                    if int(progress / 5) > int(last_percent / 5):
-                                        st.write(f"📥 Download progress: {progress:.1f}%")
-                                        print(f"   Downloaded: {progress:.1f}%")
-                                        last_percent = progress
+                logger.info("Trying mirror %s/%s...", url_idx + 1, len(download_urls))
 
+                tmp_path = None
+                progress_bar = None
+                try:
+                    # Same directory as the checkpoint, so the final move is a rename
+                    with tempfile.NamedTemporaryFile(
+                        delete=False, dir=os.path.dirname(checkpoint_path), suffix=".part"
+                    ) as tmp_file:
                         tmp_path = tmp_file.name
 
-                    # Move to final location
-                    shutil.move(tmp_path, checkpoint_path)
-
-                    if os.path.exists(checkpoint_path):
-                        size_mb = os.path.getsize(checkpoint_path) / (1024 * 1024)
-                        print(f"✅ Model downloaded: {size_mb:.1f} MB")
-                        st.success(f"✅ Model downloaded successfully! Size: {size_mb:.1f} MB")
-                        return True
+                        total_size = 0
+                        downloaded = 0
+                        last_percent = -1
+                        # Hash while writing so integrity is checked without a re-read
+                        digest = hashlib.sha256()
+                        # One bar updated in place rather than a new line per tick
+                        progress_bar = st.progress(0.0, text="📥 Downloading Wav2Lip model...")
+
+                        for attempt in range(Config.MAX_RETRY_ATTEMPTS):
+                            # After a dropped connection, continue from the bytes on disk
+                            headers = {'Range': f'bytes={downloaded}-'} if downloaded else {}
+                            try:
+                                with session.get(url, stream=True, timeout=(5, 60),
+                                                 headers=headers) as response:
+                                    response.raise_for_status()
+
+                                    if downloaded and response.status_code != 206:
+                                        # Server ignored the range - start over
+                                        logger.warning("⚠️ Mirror does not support resume, restarting")
+                                        tmp_file.seek(0)
+                                        tmp_file.truncate()
+                                        digest = hashlib.sha256()
+                                        downloaded = 0
+
+                                    if not downloaded:
+                                        total_size = int(response.headers.get('content-length', 0))
+                                        logger.debug("Total size: %.1f MB", total_size / (1024*1024))
+                                        # Reserve the full size up front for a contiguous file
+                                        if total_size and hasattr(os, 'posix_fallocate'):
+                                            os.posix_fallocate(tmp_file.fileno(), 0, total_size)
+
+                                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                                        if chunk:
+                                            digest.update(chunk)
+                                            tmp_file.write(chunk)
+                                            downloaded += len(chunk)
+
+                                            if total_size > 0:
+                                                progress = (downloaded / total_size) * 100
+                                                # Only touch the bar when the whole percent changes
+                                                if int(progress) > int(last_percent):
+                                                    progress_bar.progress(
+                                                        min(downloaded / total_size, 1.0),
+                                                        text=f"📥 Download progress: {progress:.0f}%"
+                                                    )
+                                                    if int(progress / 5) > int(last_percent / 5):
+                                                        logger.debug("Downloaded: %.1f%%", progress)
+                                                    last_percent = progress
+                                break
+                            except resumable_errors as e:
+                                if attempt == Config.MAX_RETRY_ATTEMPTS - 1:
+                                    raise
+                                logger.warning("⚠️ Connection dropped at %s bytes, resuming: %s", downloaded, e)
+
+                        # Data must be on disk before the rename makes it visible
+                        tmp_file.flush()
+                        os.fsync(tmp_file.fileno())
+
+                    if total_size and downloaded != total_size:
+                        raise IOError(f"Incomplete download: {downloaded} of {total_size} bytes")
+
+                    sha256 = digest.hexdigest()
+                    logger.info("SHA256: %s", sha256)
+                    if expected_sha256 and sha256 != expected_sha256.lower():
+                        raise IOError(f"Checksum mismatch: got {sha256}, expected {expected_sha256}")
+
+                    # Atomic rename into place
+                    os.replace(tmp_path, checkpoint_path)
+                finally:
+                    # Also on failure, so a dead mirror doesn't leave a stale bar
+                    if progress_bar is not None:
+                        progress_bar.empty()
+                    if tmp_path and os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+
+                if _checkpoint_ready(checkpoint_path):
+                    # Drop any cached "checkpoint missing" state
+                    _requirements_state.clear()
+                    size_mb = os.path.getsize(checkpoint_path) / (1024 * 1024)
+                    logger.info("✅ Model downloaded: %.1f MB", size_mb)
+                    st.success(f"✅ Model downloaded successfully! Size: {size_mb:.1f} MB")
+                    return True
 
             except Exception as e:
-                print(f"⚠️ Mirror {url_idx + 1} failed: {e}")
+                logger.warning("⚠️ Mirror %s failed: %s", url_idx + 1, e)
                 st.warning(f"Failed to download from mirror {url_idx + 1}: {e}")
                 continue
 
         # All mirrors failed
-        print(f"❌ Failed to download from all mirrors")
+        logger.error("❌ Failed to download from all mirrors")
         st.error("❌ Failed to download Wav2Lip model from all mirrors")
         st.info("Please download the model manually:")
         st.code("wget -O Wav2Lip/checkpoints/wav2lip_gan.pth https://iiitaphyd-my.sharepoint.com/personal/radrabha_m_research_iiit_ac_in/_layouts/15/download.aspx?share=EuqU-7p6CpdDvAuqzX2yS9YBziX0mO6EN6x1sD4NsG_2TQ")
         return False
 
-    except ImportError:
-        st.error("❌ Missing requests library for model download")
-        return False
     except Exception as e:
         st.error(f"❌ Model download failed: {e}")
-        print(f"❌ Model download error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Model download error: %s", e)
         return False
\ No newline at end of file